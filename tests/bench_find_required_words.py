@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Benchmark find-friendly-words against synthetic word lists.
+
+Every combination of word list size, strategy and --parallel level is run
+against a generated word list where a known set of words is hostile, and the
+probe count, wall time and peak RSS of each run is reported. Hostile words
+can be:
+
+- independent: each hostile word breaks the command on its own
+- clustered: as above, but the hostile words are next to each other in the
+  word list, in runs of --cluster-size
+- pairs: the command only breaks when both words of a hostile pair are marked
+  friendly, so either one of them can be found hostile
+
+The oracle is either a cheap shell command (grep or awk) that is run for every
+probe, or this script acting as a --worker-command, which measures the
+overhead of find-friendly-words itself without the cost of starting a process
+for every probe.
+
+Example:
+
+    tests/bench_find_required_words.py --sizes=1000,10000 --strategies=2,3 --parallel=1,8
+"""
+from pathlib import Path
+from subprocess import DEVNULL
+import argparse
+import json
+import os
+import random
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+
+DOTFILES_ROOT = Path(__file__).parent.parent
+
+PATTERNS = ['independent', 'clustered', 'pairs']
+ORACLES = ['command', 'worker']
+
+# find the pairs in the word list file, and fail if both words of a pair are there
+AWK_PAIRS = 'NR == FNR { partner[$1] = $2; next } { seen[$0] = 1 } END { for (w in partner) if ((w in seen) && (partner[w] in seen)) exit 1 }'
+
+
+def main() -> None:
+    if sys.argv[1:2] == ['--oracle-worker']:
+        _oracle_worker(Path(sys.argv[2]))
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=_int_list, default=[1000], help="Word list sizes, e.g. 1000,10000")
+    parser.add_argument('--strategies', type=lambda s: s.split(','), default=['1', '2', '3', '4'])
+    parser.add_argument('--parallel', type=_int_list, default=[1, 4])
+    parser.add_argument('--density', type=float, default=0.01, help="Fraction of words that are hostile")
+    parser.add_argument('--pattern', choices=PATTERNS, default='independent')
+    parser.add_argument('--cluster-size', type=int, default=4)
+    parser.add_argument('--oracle', choices=ORACLES, default='command')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--script', type=str, default=str(DOTFILES_ROOT / 'bin/find-friendly-words'),
+                        help="The find-friendly-words to benchmark (e.g. a copy from another branch)")
+    parser.add_argument('--json', type=str, help="Also write the results to this file")
+    args = parser.parse_args()
+
+    for strategy in args.strategies:
+        if strategy not in ('1', '2', '3', '4'):
+            raise Exception(f"Invalid strategy: {strategy}")
+
+    results = []
+    print(_format_row(['words', 'hostile', 'strategy', 'parallel', 'probes', 'wall', 'peak rss', 'result']))
+    for size in args.sizes:
+        words, hostile_groups = _generate(size, args.density, args.pattern, args.cluster_size, args.seed)
+        for strategy in args.strategies:
+            for parallel in args.parallel:
+                result = _run_one(
+                    words,
+                    hostile_groups,
+                    pattern=args.pattern,
+                    oracle=args.oracle,
+                    strategy=strategy,
+                    parallel=parallel,
+                    script=args.script,
+                )
+                results.append(result)
+                print(_format_row([
+                    str(size),
+                    str(result["hostile_expected"]),
+                    strategy,
+                    str(parallel),
+                    str(result["probes"]),
+                    f"{result['wall_seconds']:.2f}s",
+                    f"{result['peak_rss_kb'] // 1024}MB",
+                    result["result"],
+                ]))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({"args": {k: v for k, v in vars(args).items() if k != 'json'}, "results": results}, f, indent=2)
+
+    if any(result["result"] != 'ok' for result in results):
+        sys.exit(1)
+
+
+def _int_list(value: str) -> list[int]:
+    return [int(part) for part in value.split(',')]
+
+
+def _format_row(cells: list[str]) -> str:
+    return '  '.join(cell.rjust(9) for cell in cells)
+
+
+def _generate(
+    size: int,
+    density: float,
+    pattern: str,
+    cluster_size: int,
+    seed: int,
+) -> tuple[list[str], list[list[str]]]:
+    """Returns the (sorted) word list, and the groups of words that are hostile together.
+
+    Each group is a single word, unless the pattern is 'pairs'.
+    """
+    rng = random.Random(seed)
+    words = [f"word{index:07d}" for index in range(size)]
+    num_hostile = max(1, round(size * density))
+
+    if pattern == 'independent':
+        return words, [[word] for word in rng.sample(words, num_hostile)]
+
+    if pattern == 'clustered':
+        hostile: set[str] = set()
+        while len(hostile) < num_hostile:
+            start = rng.randrange(size)
+            hostile.update(words[start:start + min(cluster_size, num_hostile - len(hostile))])
+        return words, [[word] for word in sorted(hostile)]
+
+    assert pattern == 'pairs'
+    # pair up words from anywhere in the list, so that bisection usually has
+    # to find the second word of a pair in a different batch
+    chosen = rng.sample(words, min(size - size % 2, max(2, num_hostile * 2)))
+    return words, [sorted(chosen[i:i + 2]) for i in range(0, len(chosen) - 1, 2)]
+
+
+def _run_one(
+    words: list[str],
+    hostile_groups: list[list[str]],
+    *,
+    pattern: str,
+    oracle: str,
+    strategy: str,
+    parallel: int,
+    script: str,
+) -> dict:
+    with tempfile.TemporaryDirectory() as tempdir:
+        tmpdir = Path(tempdir)
+        (tmpdir / 'all_words.txt').write_text(''.join(word + '\n' for word in words))
+        (tmpdir / 'hostile.txt').write_text(''.join(' '.join(group) + '\n' for group in hostile_groups))
+        state_dir = tmpdir / 'state'
+        state_dir.mkdir()
+
+        cmd = [
+            script,
+            f'--state-dir={state_dir}',
+            '--hostile-word=required',
+            '--friendly-word=optional',
+            f'--word-list-file={tmpdir}/all_words.txt',
+            '--word-list-path-var=SOME_FILE',
+            f'--strategy={strategy}',
+            f'--parallel={parallel}',
+            f'--summary-json={tmpdir}/summary.json',
+            '--no-verify',
+            '--no-probe-cache',
+            '--status-interval=0',
+        ]
+        hostile_file = shlex.quote(str(tmpdir / 'hostile.txt'))
+        if oracle == 'worker':
+            cmd.append('--worker-command=' + shlex.join([sys.executable, __file__, '--oracle-worker', str(tmpdir / 'hostile.txt')]))
+        elif pattern == 'pairs':
+            cmd.append(f'--command=awk {shlex.quote(AWK_PAIRS)} {hostile_file} "$SOME_FILE"')
+        else:
+            cmd.append(f'--command=! grep -qxFf {hostile_file} "$SOME_FILE"')
+
+        started = time.monotonic()
+        proc = subprocess.Popen(cmd, stdout=DEVNULL)
+        # wait4() gives the peak RSS of this run alone, rather than of every
+        # child process this script has waited for
+        _, status, rusage = os.wait4(proc.pid, 0)
+        wall_seconds = time.monotonic() - started
+        proc.returncode = os.waitstatus_to_exitcode(status)
+
+        result = {
+            "words": len(words),
+            "hostile_expected": len(hostile_groups),
+            "pattern": pattern,
+            "oracle": oracle,
+            "strategy": strategy,
+            "parallel": parallel,
+            "probes": None,
+            "wall_seconds": round(wall_seconds, 3),
+            "peak_rss_kb": rusage.ru_maxrss,
+            "result": f"exit {proc.returncode}",
+        }
+        if proc.returncode != 0:
+            return result
+
+        summary = json.loads((tmpdir / 'summary.json').read_text())
+        result["probes"] = len(summary["timing"]["probes"])
+        result["probe_seconds"] = summary["timing"]["probe_seconds"]
+        found = set((state_dir / 'required.txt').read_text().split()) if (state_dir / 'required.txt').exists() else set()
+        result["hostile_found"] = len(found)
+        result["result"] = _check_result(found, hostile_groups, pattern)
+        return result
+
+
+def _check_result(found: set[str], hostile_groups: list[list[str]], pattern: str) -> str:
+    if pattern != 'pairs':
+        expected = {group[0] for group in hostile_groups}
+        if found == expected:
+            return 'ok'
+        return f"{len(expected - found)} missed, {len(found - expected)} wrong"
+
+    # one word from each pair is enough, and it doesn't matter which
+    unbroken = sum(1 for group in hostile_groups if not found.intersection(group))
+    extra = len(found) - len(hostile_groups)
+    if unbroken:
+        return f"{unbroken} pairs missed"
+    if extra > 0:
+        return f"{extra} extra"
+    return 'ok'
+
+
+def _oracle_worker(hostile_file: Path) -> None:
+    """Behave as a find-friendly-words --worker-command."""
+    groups = [line.split() for line in hostile_file.read_text().splitlines() if line]
+    watched = {word for group in groups for word in group}
+    for line in sys.stdin:
+        with open(line.rstrip('\n')) as f:
+            seen = {word for word in f.read().split() if word in watched}
+        ok = not any(all(word in seen for word in group) for group in groups)
+        sys.stdout.write('pass\n' if ok else 'fail\n')
+        sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,12 @@
 from pathlib import Path
+import fcntl
+import gzip
+import json
+import sqlite3
 import tempfile
+import time
 from textwrap import dedent
-from subprocess import run
+from subprocess import DEVNULL, Popen, run
 
 WORD_LIST_1 = list(filter(None, dedent(
     '''
@@ -37,8 +42,10 @@ def test_1():
         state_dir.mkdir()
 
         cmd = [
-            str(DOTFILES_ROOT / 'bin/find-required-words'),
+            str(DOTFILES_ROOT / 'bin/find-friendly-words'),
             f'--state-dir={state_dir}',
+            '--hostile-word=required',
+            '--friendly-word=optional',
             '--parallel=2',
             # the original words list
             f'--word-list-file={tmpdir}/all_words.txt',
@@ -62,7 +69,7 @@ def test_1():
 
 @test
 def test_2():
-    # test that Strategy1 correctly does binary search of leftover words at end
+    # test that Strategy2 correctly does binary search of the word list
     words = [
         '00_yes',
         '01_yes',
@@ -82,8 +89,811 @@ def test_2():
     ]
 
     # order of evaluation should be:
-    # 00-07, 00-03, 00-01, 02-3, 02, 03, 08-14
-    return  # TODO: implement a binary search strategy
+    # 00-07, 00-03, 00-01, 02, 03-10, 11-14
+    with tempfile.TemporaryDirectory() as tempdir:
+        tmpdir = Path(tempdir)
+        with open(tmpdir / 'all_words.txt', 'x') as f:
+            f.write('\n'.join(words))
+
+        state_dir = tmpdir / 'workhere'
+        state_dir.mkdir()
+
+        cmd = [
+            str(DOTFILES_ROOT / 'bin/find-friendly-words'),
+            f'--state-dir={state_dir}',
+            '--hostile-word=no',
+            '--friendly-word=yes',
+            '--strategy=2',
+            f'--word-list-file={tmpdir}/all_words.txt',
+            '--word-list-path-var=SOME_FILE',
+            '--command=! grep _no $SOME_FILE',
+            f"--summary-json={tmpdir}/summary.json",
+        ]
+        run(cmd, check=True)
+
+        final_no_words = set((state_dir / 'no.txt').read_text().splitlines())
+        final_yes_words = set((state_dir / 'yes.txt').read_text().splitlines())
+        assert final_no_words == {'02_no'}
+        assert final_yes_words == set(words) - {'02_no'}
+
+        summary = json.loads((tmpdir / 'summary.json').read_text())
+        assert summary['tasks_completed'] == 6
+
+
+@test
+def test_3():
+    # test that Strategy3 decodes the hostile words from overlapping pools
+    words = [f'{i:02d}_yes' for i in range(40)]
+    words[5] = '05_no'
+    words[17] = '17_no'
+    words[18] = '18_no'
+    with tempfile.TemporaryDirectory() as tempdir:
+        tmpdir = Path(tempdir)
+        with open(tmpdir / 'all_words.txt', 'x') as f:
+            f.write('\n'.join(words))
+
+        state_dir = tmpdir / 'workhere'
+        state_dir.mkdir()
+
+        cmd = [
+            str(DOTFILES_ROOT / 'bin/find-friendly-words'),
+            f'--state-dir={state_dir}',
+            '--hostile-word=no',
+            '--friendly-word=yes',
+            '--strategy=3',
+            '--parallel=8',
+            f'--word-list-file={tmpdir}/all_words.txt',
+            '--word-list-path-var=SOME_FILE',
+            '--command=! grep _no $SOME_FILE',
+            f"--summary-json={tmpdir}/summary.json",
+        ]
+        run(cmd, check=True)
+
+        final_no_words = set((state_dir / 'no.txt').read_text().splitlines())
+        final_yes_words = set((state_dir / 'yes.txt').read_text().splitlines())
+        assert final_no_words == {'05_no', '17_no', '18_no'}
+        assert final_yes_words == set(words) - final_no_words
+
+        # should need far fewer probes than checking every word on its own
+        summary = json.loads((tmpdir / 'summary.json').read_text())
+        assert summary['tasks_completed'] < len(words)
+
+
+@test
+def test_4():
+    # test that Strategy4 finds words that are only friendly together
+    words = [f'{i:02d}_yes' for i in range(20)]
+    words[3] = '03_no'
+    words[6] = '06_pair'
+    words[7] = '07_pair'
+    words[16] = '16_no'
+    with tempfile.TemporaryDirectory() as tempdir:
+        tmpdir = Path(tempdir)
+        with open(tmpdir / 'all_words.txt', 'x') as f:
+            f.write('\n'.join(words))
+
+        state_dir = tmpdir / 'workhere'
+        state_dir.mkdir()
+
+        cmd = [
+            str(DOTFILES_ROOT / 'bin/find-friendly-words'),
+            f'--state-dir={state_dir}',
+            '--hostile-word=no',
+            '--friendly-word=yes',
+            '--strategy=4',
+            '--parallel=4',
+            f'--word-list-file={tmpdir}/all_words.txt',
+            '--word-list-path-var=SOME_FILE',
+            '--command=! grep _no $SOME_FILE',
+            # the two _pair words must be friendly together or not at all
+            '--command=[ "$(grep -c _pair $SOME_FILE)" != 1 ]',
+        ]
+        run(cmd, check=True)
+
+        final_no_words = set((state_dir / 'no.txt').read_text().splitlines())
+        final_yes_words = set((state_dir / 'yes.txt').read_text().splitlines())
+        assert final_no_words == {'03_no', '16_no'}
+        assert final_yes_words == set(words) - final_no_words
+
+
+@test
+def test_5():
+    # test that a restart reuses the results of previous command runs
+    with tempfile.TemporaryDirectory() as tempdir:
+        tmpdir = Path(tempdir)
+        with open(tmpdir / 'all_words.txt', 'x') as f:
+            f.write('\n'.join(WORD_LIST_1))
+
+        state_dir = tmpdir / 'workhere'
+        state_dir.mkdir()
+
+        cmd = [
+            str(DOTFILES_ROOT / 'bin/find-friendly-words'),
+            f'--state-dir={state_dir}',
+            '--hostile-word=required',
+            '--friendly-word=optional',
+            f'--word-list-file={tmpdir}/all_words.txt',
+            '--word-list-path-var=SOME_FILE',
+            f'--command=echo run >> {tmpdir}/runs.txt; ! grep red $SOME_FILE',
+            # checking red first would mean different probes to last time
+            '--no-learned-order',
+        ]
+        run(cmd, check=True)
+        runs_before = (tmpdir / 'runs.txt').read_text()
+
+        # forget the verdicts so that every word has to be checked again
+        (state_dir / 'required.txt').unlink()
+        (state_dir / 'optional.txt').unlink()
+        run(cmd, check=True)
+
+        assert (tmpdir / 'runs.txt').read_text() == runs_before
+        final_required_words = set((state_dir / 'required.txt').read_text().splitlines())
+        assert final_required_words == {'red'}
+
+
+@test
+def test_6():
+    # test that an incomplete line left by an interrupted append is discarded,
+    # but a whole word without a newline (e.g. from a hand edit) is kept
+    with tempfile.TemporaryDirectory() as tempdir:
+        tmpdir = Path(tempdir)
+        with open(tmpdir / 'all_words.txt', 'x') as f:
+            f.write('\n'.join(WORD_LIST_1))
+
+        state_dir = tmpdir / 'workhere'
+        state_dir.mkdir()
+        (state_dir / 'optional.txt').write_text('car\ngnome\nkni')
+        (state_dir / 'required.txt').write_text('red')
+
+        cmd = [
+            str(DOTFILES_ROOT / 'bin/find-friendly-words'),
+            f'--state-dir={state_dir}',
+            '--hostile-word=required',
+            '--friendly-word=optional',
+            f'--word-list-file={tmpdir}/all_words.txt',
+            '--word-list-path-var=SOME_FILE',
+            '--command=! grep red $SOME_FILE',
+        ]
+        output = run(cmd, check=True, capture_output=True, text=True).stdout
+        assert "discarding 'kni'" in output
+        assert "keeping 'red'" in output
+        # red was already known to be required, so it wasn't checked again
+        assert 'word red is required' not in output
+
+        final_optional_words = (state_dir / 'optional.txt').read_text().splitlines()
+        assert sorted(final_optional_words) == ['battle', 'car', 'fork', 'gnome', 'knife', 'spoon']
+        assert (state_dir / 'required.txt').read_text() == 'red\n'
+        # the .lock file is left behind, but it's only ever flock()ed
+        assert not (state_dir / 'optional.txt.new').exists()
+
+
+@test
+def test_7():
+    # test that the other commands are cancelled as soon as one fails
+    with tempfile.TemporaryDirectory() as tempdir:
+        tmpdir = Path(tempdir)
+        with open(tmpdir / 'all_words.txt', 'x') as f:
+            f.write('\n'.join(WORD_LIST_1))
+
+        state_dir = tmpdir / 'workhere'
+        state_dir.mkdir()
+
+        cmd = [
+            str(DOTFILES_ROOT / 'bin/find-friendly-words'),
+            f'--state-dir={state_dir}',
+            '--hostile-word=required',
+            '--friendly-word=optional',
+            '--parallel=2',
+            f'--word-list-file={tmpdir}/all_words.txt',
+            '--word-list-path-var=SOME_FILE',
+            '--command=! grep red $SOME_FILE',
+            '--command=if grep red $SOME_FILE; then sleep 30; fi',
+        ]
+        started = time.time()
+        run(cmd, check=True)
+        assert time.time() - started < 20
+
+        final_required_words = set((state_dir / 'required.txt').read_text().splitlines())
+        assert final_required_words == {'red'}
+
+
+@test
+def test_8():
+    # test that --worker-command workers are reused between probes
+    with tempfile.TemporaryDirectory() as tempdir:
+        tmpdir = Path(tempdir)
+        with open(tmpdir / 'all_words.txt', 'x') as f:
+            f.write('\n'.join(WORD_LIST_1))
+
+        state_dir = tmpdir / 'workhere'
+        state_dir.mkdir()
+
+        worker = (
+            f'echo started >> {tmpdir}/starts.txt; '
+            'while read path; do '
+            '  if grep -q -e red -e fork "$path"; then echo fail; else echo pass; fi; '
+            'done'
+        )
+        cmd = [
+            str(DOTFILES_ROOT / 'bin/find-friendly-words'),
+            f'--state-dir={state_dir}',
+            '--hostile-word=required',
+            '--friendly-word=optional',
+            '--parallel=2',
+            f'--word-list-file={tmpdir}/all_words.txt',
+            '--word-list-path-var=SOME_FILE',
+            f'--worker-command={worker}',
+            '--command=! grep battle $SOME_FILE',
+        ]
+        run(cmd, check=True)
+
+        assert len((tmpdir / 'starts.txt').read_text().splitlines()) <= 2
+        final_required_words = set((state_dir / 'required.txt').read_text().splitlines())
+        final_optional_words = set((state_dir / 'optional.txt').read_text().splitlines())
+        assert final_required_words == {'red', 'battle', 'fork'}
+        assert final_optional_words == {'car', 'gnome', 'knife', 'spoon'}
+
+
+@test
+def test_9():
+    # test that commands run in sandboxes that are reused between probes
+    with tempfile.TemporaryDirectory() as tempdir:
+        tmpdir = Path(tempdir)
+        with open(tmpdir / 'all_words.txt', 'x') as f:
+            f.write('\n'.join(WORD_LIST_1))
+
+        checkout = tmpdir / 'checkout'
+        checkout.mkdir()
+        (checkout / 'setup.py').write_text('# nothing here\n')
+
+        # the state dir is inside the checkout, but mustn't be copied into the sandboxes
+        state_dir = checkout / 'workhere'
+        state_dir.mkdir()
+
+        cmd = [
+            str(DOTFILES_ROOT / 'bin/find-friendly-words'),
+            f'--state-dir={state_dir}',
+            '--hostile-word=required',
+            '--friendly-word=optional',
+            '--parallel=2',
+            f'--word-list-file={tmpdir}/all_words.txt',
+            '--word-list-path-var=SOME_FILE',
+            f'--sandbox-source={checkout}',
+            '--sandbox-path-var=SANDBOX',
+            '--command=test -e $SANDBOX/setup.py && ! test -e $SANDBOX/workhere',
+            f'--command=touch $SANDBOX/build-cache; echo $SANDBOX >> {tmpdir}/sandboxes.txt',
+            '--command=! grep red $SOME_FILE',
+        ]
+        run(cmd, check=True)
+
+        sandboxes_used = set((tmpdir / 'sandboxes.txt').read_text().splitlines())
+        assert 1 <= len(sandboxes_used) <= 3
+        assert not (checkout / 'build-cache').exists()
+        final_required_words = set((state_dir / 'required.txt').read_text().splitlines())
+        assert final_required_words == {'red'}
+
+
+@test
+def test_10():
+    # test that --parallel=auto works and reports the levels it used
+    with tempfile.TemporaryDirectory() as tempdir:
+        tmpdir = Path(tempdir)
+        words = [f'{i:02d}_yes' for i in range(30)]
+        words[11] = '11_no'
+        with open(tmpdir / 'all_words.txt', 'x') as f:
+            f.write('\n'.join(words))
+
+        state_dir = tmpdir / 'workhere'
+        state_dir.mkdir()
+
+        cmd = [
+            str(DOTFILES_ROOT / 'bin/find-friendly-words'),
+            f'--state-dir={state_dir}',
+            '--hostile-word=no',
+            '--friendly-word=yes',
+            # more than the number of CPUs, so that the limit has room to grow
+            # even on a machine with one CPU
+            '--parallel=auto:4',
+            f'--word-list-file={tmpdir}/all_words.txt',
+            '--word-list-path-var=SOME_FILE',
+            '--command=! grep _no $SOME_FILE',
+            f"--summary-json={tmpdir}/summary.json",
+        ]
+        run(cmd, check=True)
+
+        final_no_words = set((state_dir / 'no.txt').read_text().splitlines())
+        assert final_no_words == {'11_no'}
+
+        summary = json.loads((tmpdir / 'summary.json').read_text())
+        levels = summary['parallel_levels']
+        assert len(levels) > 0
+        for level in levels:
+            assert 1 <= level['limit'] <= 4
+        # the controller starts at half the maximum and steps up after the
+        # first window unless the machine is overloaded
+        assert len({level['limit'] for level in levels}) > 1
+
+
+@test
+def test_11():
+    # test that chatty commands can have their output compressed in the --log-dir
+    with tempfile.TemporaryDirectory() as tempdir:
+        tmpdir = Path(tempdir)
+        with open(tmpdir / 'all_words.txt', 'x') as f:
+            f.write('\n'.join(WORD_LIST_1))
+
+        state_dir = tmpdir / 'workhere'
+        state_dir.mkdir()
+
+        cmd = [
+            str(DOTFILES_ROOT / 'bin/find-friendly-words'),
+            f'--state-dir={state_dir}',
+            f'--log-dir={tmpdir}/logs',
+            '--compress-logs',
+            '--hostile-word=required',
+            '--friendly-word=optional',
+            f'--word-list-file={tmpdir}/all_words.txt',
+            '--word-list-path-var=SOME_FILE',
+            '--command=seq 1 100000; ! grep red $SOME_FILE',
+        ]
+        run(cmd, check=True)
+
+        with gzip.open(tmpdir / 'logs/segment-0000.log.gz', 'rt') as f:
+            assert 'red' in f.read().splitlines()
+
+        logs = run(
+            [str(DOTFILES_ROOT / 'bin/find-friendly-words'), 'logs', f'--log-dir={tmpdir}/logs', 'red'],
+            check=True,
+            capture_output=True,
+            text=True,
+        )
+        assert logs.stdout.splitlines()[-2:] == ['100000', 'red']
+
+        final_required_words = set((state_dir / 'required.txt').read_text().splitlines())
+        assert final_required_words == {'red'}
+
+
+@test
+def test_12():
+    # test that output from every probe ends up in one indexed archive
+    with tempfile.TemporaryDirectory() as tempdir:
+        tmpdir = Path(tempdir)
+        with open(tmpdir / 'all_words.txt', 'x') as f:
+            f.write('\n'.join(WORD_LIST_1))
+
+        state_dir = tmpdir / 'workhere'
+        state_dir.mkdir()
+
+        script = str(DOTFILES_ROOT / 'bin/find-friendly-words')
+        cmd = [
+            script,
+            f'--state-dir={state_dir}',
+            f'--log-dir={tmpdir}/logs',
+            '--hostile-word=required',
+            '--friendly-word=optional',
+            f'--word-list-file={tmpdir}/all_words.txt',
+            '--word-list-path-var=SOME_FILE',
+            '--command=echo first; ! grep red $SOME_FILE',
+            '--command=echo second; ! grep fork $SOME_FILE',
+        ]
+        run(cmd, check=True)
+
+        assert sorted(p.name for p in (tmpdir / 'logs').iterdir()) == ['index.sqlite3', 'segment-0000.log']
+
+        def logs(*args):
+            cmd = [script, 'logs', f'--log-dir={tmpdir}/logs', *args]
+            return run(cmd, check=True, capture_output=True, text=True).stdout
+
+        assert logs('--command=1', 'fork') == 'second\nfork\n'
+        assert logs('--command=0', 'spoon') == 'first\n'
+        assert 'second' in logs('--verify', 'in-isolation')
+
+        final_required_words = set((state_dir / 'required.txt').read_text().splitlines())
+        assert final_required_words == {'red', 'fork'}
+
+
+@test
+def test_13():
+    # test that probe timings are reported in the summary and status lines
+    with tempfile.TemporaryDirectory() as tempdir:
+        tmpdir = Path(tempdir)
+        with open(tmpdir / 'all_words.txt', 'x') as f:
+            f.write('\n'.join(WORD_LIST_1))
+
+        state_dir = tmpdir / 'workhere'
+        state_dir.mkdir()
+
+        cmd = [
+            str(DOTFILES_ROOT / 'bin/find-friendly-words'),
+            f'--state-dir={state_dir}',
+            '--hostile-word=required',
+            '--friendly-word=optional',
+            f'--word-list-file={tmpdir}/all_words.txt',
+            '--word-list-path-var=SOME_FILE',
+            '--command=sleep 0.2; ! grep red $SOME_FILE',
+            f"--summary-json={tmpdir}/summary.json",
+            '--status-interval=0.3',
+        ]
+        output = run(cmd, check=True, capture_output=True, text=True).stdout
+        assert 'probes/minute' in output
+
+        summary = json.loads((tmpdir / 'summary.json').read_text())
+        timing = summary['timing']
+        assert len(timing['probes']) == summary['tasks_completed']
+        assert timing['probes_per_minute'] > 0
+        assert timing['verdicts'] == {'pass': 6, 'fail': 1}
+        assert timing['command_seconds']['command0']['p50'] >= 0.2
+        assert timing['probe_seconds']['max'] >= timing['probe_seconds']['p50']
+
+
+@test
+def test_14():
+    # test that commands which hang are killed and their word is quarantined
+    with tempfile.TemporaryDirectory() as tempdir:
+        tmpdir = Path(tempdir)
+        with open(tmpdir / 'all_words.txt', 'x') as f:
+            f.write('\n'.join(WORD_LIST_1))
+
+        state_dir = tmpdir / 'workhere'
+        state_dir.mkdir()
+
+        started = time.time()
+        cmd = [
+            str(DOTFILES_ROOT / 'bin/find-friendly-words'),
+            f'--state-dir={state_dir}',
+            '--hostile-word=required',
+            '--friendly-word=optional',
+            f'--word-list-file={tmpdir}/all_words.txt',
+            '--word-list-path-var=SOME_FILE',
+            '--command=! grep red $SOME_FILE && (! grep fork $SOME_FILE || sleep 30)',
+            '--timeout=0.5',
+            '--on-timeout=quarantine',
+        ]
+        run(cmd, check=True)
+        assert time.time() - started < 10
+
+        final_required_words = set((state_dir / 'required.txt').read_text().splitlines())
+        assert final_required_words == {'red'}
+        assert (state_dir / 'quarantined.txt').read_text().splitlines() == ['fork']
+        assert 'fork' not in (state_dir / 'optional.txt').read_text().splitlines()
+
+
+@test
+def test_15():
+    # test that words which were hostile in a previous run are checked first
+    with tempfile.TemporaryDirectory() as tempdir:
+        tmpdir = Path(tempdir)
+        with open(tmpdir / 'all_words.txt', 'x') as f:
+            f.write('\n'.join(WORD_LIST_1))
+
+        state_dir = tmpdir / 'workhere'
+        state_dir.mkdir()
+
+        cmd = [
+            str(DOTFILES_ROOT / 'bin/find-friendly-words'),
+            f'--state-dir={state_dir}',
+            '--hostile-word=required',
+            '--friendly-word=optional',
+            f'--word-list-file={tmpdir}/all_words.txt',
+            '--word-list-path-var=SOME_FILE',
+            '--command=! grep spoon $SOME_FILE',
+            '--no-probe-cache',
+        ]
+        run(cmd, check=True)
+
+        # start again with the same history
+        (state_dir / 'required.txt').unlink()
+        (state_dir / 'optional.txt').unlink()
+        output = run(cmd, check=True, capture_output=True, text=True).stdout
+        checked = [line.split()[2] for line in output.splitlines() if line.startswith('Checking word ')]
+        assert checked[0] == 'spoon'
+
+        final_required_words = set((state_dir / 'required.txt').read_text().splitlines())
+        assert final_required_words == {'spoon'}
+
+
+@test
+def test_16():
+    # test that several processes can work on the same state dir together
+    with tempfile.TemporaryDirectory() as tempdir:
+        tmpdir = Path(tempdir)
+        words = [f'word{i:02d}' for i in range(30)]
+        with open(tmpdir / 'all_words.txt', 'x') as f:
+            f.write('\n'.join(words))
+
+        state_dir = tmpdir / 'workhere'
+        state_dir.mkdir()
+
+        cmd = [
+            str(DOTFILES_ROOT / 'bin/find-friendly-words'),
+            f'--state-dir={state_dir}',
+            '--hostile-word=required',
+            '--friendly-word=optional',
+            f'--word-list-file={tmpdir}/all_words.txt',
+            '--word-list-path-var=SOME_FILE',
+            f'--command=echo $PPID >> {tmpdir}/runs.txt; sleep 0.1; ! grep -e word07 -e word23 $SOME_FILE',
+            '--cooperate',
+            '--no-verify',
+        ]
+        procs = [Popen(cmd, stdout=DEVNULL) for _ in range(3)]
+        for proc in procs:
+            assert proc.wait() == 0
+
+        final_required_words = set((state_dir / 'required.txt').read_text().splitlines())
+        final_optional_words = (state_dir / 'optional.txt').read_text().splitlines()
+        assert final_required_words == {'word07', 'word23'}
+        assert sorted(final_optional_words) == sorted(set(words) - final_required_words)
+
+        # every process did some of the work
+        assert len(set((tmpdir / 'runs.txt').read_text().split())) == 3
+
+        # a process that doesn't cooperate can't use the state dir at the same time
+        with open(state_dir / 'run.lock') as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_SH)
+            assert run(cmd[:-2] + ['--no-verify'], capture_output=True).returncode != 0
+
+
+@test
+def test_17():
+    # test that several word lists are merged, ignoring duplicates and blank lines
+    with tempfile.TemporaryDirectory() as tempdir:
+        tmpdir = Path(tempdir)
+        (tmpdir / 'words_a.txt').write_text('gnome\n\nbattle\ncar\n')
+        (tmpdir / 'words_b.txt').write_text('car\nred\n\ngnome')
+
+        state_dir = tmpdir / 'workhere'
+        state_dir.mkdir()
+
+        run([
+            str(DOTFILES_ROOT / 'bin/find-friendly-words'),
+            f'--state-dir={state_dir}',
+            '--hostile-word=required',
+            '--friendly-word=optional',
+            f'--word-list-file={tmpdir}/words_a.txt',
+            f'--word-list-file={tmpdir}/words_b.txt',
+            '--word-list-path-var=SOME_FILE',
+            '--command=! grep -x red $SOME_FILE',
+            '--no-verify',
+        ], check=True)
+
+        assert (state_dir / 'required.txt').read_text().splitlines() == ['red']
+        assert sorted((state_dir / 'optional.txt').read_text().splitlines()) == ['battle', 'car', 'gnome']
+
+
+@test
+def test_18():
+    # test that the benchmark harness runs and its oracles agree with the results
+    with tempfile.TemporaryDirectory() as tempdir:
+        tmpdir = Path(tempdir)
+        for pattern, oracle in [('independent', 'command'), ('pairs', 'command'), ('pairs', 'worker')]:
+            run([
+                str(DOTFILES_ROOT / 'tests/bench_find_required_words.py'),
+                '--sizes=64',
+                '--density=0.05',
+                '--strategies=2,4',
+                '--parallel=2',
+                f'--pattern={pattern}',
+                f'--oracle={oracle}',
+                f'--json={tmpdir}/bench.json',
+            ], check=True, stdout=DEVNULL)
+            results = json.loads((tmpdir / 'bench.json').read_text())["results"]
+            assert [result["result"] for result in results] == ['ok', 'ok']
+            assert all(result["probes"] > 0 for result in results)
+
+
+@test
+def test_19():
+    # test that a cooperating process takes over words claimed by a process
+    # that died, once their lease expires
+    with tempfile.TemporaryDirectory() as tempdir:
+        tmpdir = Path(tempdir)
+        words = [f'word{i:02d}' for i in range(6)]
+        with open(tmpdir / 'all_words.txt', 'x') as f:
+            f.write('\n'.join(words))
+
+        state_dir = tmpdir / 'workhere'
+        state_dir.mkdir()
+
+        # the dead process claimed word03 and its lease hasn't expired yet
+        conn = sqlite3.connect(state_dir / 'leases.sqlite3')
+        conn.execute(
+            'CREATE TABLE leases (word TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL)'
+        )
+        with conn:
+            conn.execute('INSERT INTO leases VALUES (?, ?, ?)', ('word03', 'deadhost:1:0', time.time() + 2))
+        conn.close()
+
+        started = time.monotonic()
+        result = run([
+            str(DOTFILES_ROOT / 'bin/find-friendly-words'),
+            f'--state-dir={state_dir}',
+            '--hostile-word=required',
+            '--friendly-word=optional',
+            f'--word-list-file={tmpdir}/all_words.txt',
+            '--word-list-path-var=SOME_FILE',
+            '--command=! grep -e word03 $SOME_FILE',
+            '--cooperate',
+            '--no-verify',
+            f'--summary-json={tmpdir}/summary.json',
+        ], check=True, capture_output=True, text=True)
+
+        assert 'Waiting for 1 word(s) that are being checked by other processes' in result.stdout
+        assert time.monotonic() - started >= 2
+        # waiting for the lease to expire isn't counted as a task
+        summary = json.loads((tmpdir / 'summary.json').read_text())
+        assert summary['tasks_completed'] == len(words)
+        assert (state_dir / 'required.txt').read_text().splitlines() == ['word03']
+        assert sorted((state_dir / 'optional.txt').read_text().splitlines()) == sorted(set(words) - {'word03'})
+
+
+@test
+def test_20():
+    # test that workers which die or send garbage are restarted
+    with tempfile.TemporaryDirectory() as tempdir:
+        tmpdir = Path(tempdir)
+        with open(tmpdir / 'all_words.txt', 'x') as f:
+            f.write('\n'.join(WORD_LIST_1))
+
+        state_dir = tmpdir / 'workhere'
+        state_dir.mkdir()
+
+        # each worker answers two probes, then the first worker sends garbage
+        # for the third and the rest exit without reading it
+        worker = (
+            f'echo started >> {tmpdir}/starts.txt; '
+            'for i in 1 2; do '
+            '  read path || exit; '
+            '  if grep -q -e red -e fork "$path"; then echo fail; else echo pass; fi; '
+            'done; '
+            'echo "worker going away" >&2; '
+            f'if [ $(wc -l < {tmpdir}/starts.txt) -eq 1 ]; then read path; echo garbage; fi'
+        )
+        result = run([
+            str(DOTFILES_ROOT / 'bin/find-friendly-words'),
+            f'--state-dir={state_dir}',
+            '--hostile-word=required',
+            '--friendly-word=optional',
+            '--strategy=1',
+            f'--word-list-file={tmpdir}/all_words.txt',
+            '--word-list-path-var=SOME_FILE',
+            f'--worker-command={worker}',
+            '--no-verify',
+        ], check=True, capture_output=True, text=True)
+
+        # without --log-dir, the workers' stderr goes to the terminal
+        assert 'worker going away' in result.stderr
+        assert "sent an invalid reply 'garbage' - restarting it" in result.stdout
+        assert "exited unexpectedly - restarting it" in result.stdout
+        final_required_words = set((state_dir / 'required.txt').read_text().splitlines())
+        final_optional_words = set((state_dir / 'optional.txt').read_text().splitlines())
+        assert final_required_words == {'red', 'fork'}
+        assert final_optional_words == {'car', 'gnome', 'battle', 'knife', 'spoon'}
+
+
+@test
+def test_21():
+    # test that CRLF line endings and whitespace around words are ignored
+    with tempfile.TemporaryDirectory() as tempdir:
+        tmpdir = Path(tempdir)
+        (tmpdir / 'words_crlf.txt').write_bytes(b'gnome\r\nbattle\r\n  car \r\n\r\nred\r\n')
+        (tmpdir / 'words_lf.txt').write_bytes(b'car\nspoon\n')
+
+        state_dir = tmpdir / 'workhere'
+        state_dir.mkdir()
+
+        run([
+            str(DOTFILES_ROOT / 'bin/find-friendly-words'),
+            f'--state-dir={state_dir}',
+            '--hostile-word=required',
+            '--friendly-word=optional',
+            f'--word-list-file={tmpdir}/words_crlf.txt',
+            f'--word-list-file={tmpdir}/words_lf.txt',
+            '--word-list-path-var=SOME_FILE',
+            '--command=! grep -x red $SOME_FILE',
+            '--no-verify',
+        ], check=True)
+
+        assert (state_dir / 'required.txt').read_bytes() == b'red\n'
+        assert sorted((state_dir / 'optional.txt').read_bytes().splitlines()) == [b'battle', b'car', b'gnome', b'spoon']
+
+
+@test
+def test_22():
+    # test that only probes whose command really ran are counted in the
+    # runtimes of words, not cache hits or timeouts
+    with tempfile.TemporaryDirectory() as tempdir:
+        tmpdir = Path(tempdir)
+        words = ['gnome', 'red', 'slow']
+        with open(tmpdir / 'all_words.txt', 'x') as f:
+            f.write('\n'.join(words))
+
+        state_dir = tmpdir / 'workhere'
+        state_dir.mkdir()
+
+        cmd = [
+            str(DOTFILES_ROOT / 'bin/find-friendly-words'),
+            f'--state-dir={state_dir}',
+            '--hostile-word=required',
+            '--friendly-word=optional',
+            f'--word-list-file={tmpdir}/all_words.txt',
+            '--word-list-path-var=SOME_FILE',
+            '--command=! grep -x red $SOME_FILE && ! (grep -qx slow $SOME_FILE && sleep 5)',
+            '--timeout=0.5',
+            '--on-timeout=quarantine',
+            # the same order both times, so that the second run has the same probes
+            '--no-learned-order',
+            '--no-verify',
+        ]
+        run(cmd, check=True)
+
+        def get_probes() -> dict[str, int]:
+            conn = sqlite3.connect(state_dir / 'word-history.sqlite3')
+            try:
+                return dict(conn.execute('SELECT word, probes FROM words'))
+            finally:
+                conn.close()
+
+        probes = get_probes()
+        assert probes.get('gnome') == 1
+        assert probes.get('red') == 1
+        assert probes.get('slow', 0) == 0
+
+        # every probe is answered from the cache the second time around
+        for name in ['optional.txt', 'required.txt', 'quarantined.txt']:
+            (state_dir / name).unlink(missing_ok=True)
+        run(cmd, check=True)
+        assert get_probes() == probes
+
+
+@test
+def test_23():
+    # test that worker output goes in the --log-dir archive with everything else
+    with tempfile.TemporaryDirectory() as tempdir:
+        tmpdir = Path(tempdir)
+        with open(tmpdir / 'all_words.txt', 'x') as f:
+            f.write('\n'.join(WORD_LIST_1))
+
+        state_dir = tmpdir / 'workhere'
+        state_dir.mkdir()
+
+        # the worker crashes on its second probe, so it's restarted once
+        worker = (
+            'echo "worker starting" >&2; '
+            'read path || exit; '
+            'if grep -q -e red -e fork "$path"; then echo fail; else echo pass; fi; '
+            f'if [ ! -e {tmpdir}/crashed ]; then touch {tmpdir}/crashed; echo "worker crashing" >&2; exit 1; fi; '
+            'while read path; do '
+            '  if grep -q -e red -e fork "$path"; then echo fail; else echo pass; fi; '
+            'done; '
+            'echo "worker done" >&2'
+        )
+        script = str(DOTFILES_ROOT / 'bin/find-friendly-words')
+        result = run([
+            script,
+            f'--state-dir={state_dir}',
+            f'--log-dir={tmpdir}/logs',
+            '--hostile-word=required',
+            '--friendly-word=optional',
+            '--strategy=1',
+            '--parallel=1',
+            f'--word-list-file={tmpdir}/all_words.txt',
+            '--word-list-path-var=SOME_FILE',
+            f'--worker-command={worker}',
+            '--no-verify',
+        ], check=True, capture_output=True, text=True)
+
+        assert 'worker' not in result.stderr
+        assert ">>> Output of worker" in result.stdout
+        assert sorted(p.name for p in (tmpdir / 'logs').iterdir()) == ['index.sqlite3', 'segment-0000.log']
+
+        def logs(*args):
+            cmd = [script, 'logs', f'--log-dir={tmpdir}/logs', '--worker', *args]
+            return run(cmd, check=True, capture_output=True, text=True).stdout
+
+        assert logs('--attempt=1', '0') == 'worker starting\nworker crashing\n'
+        assert logs('--attempt=2', '0') == 'worker starting\nworker done\n'
+        final_required_words = set((state_dir / 'required.txt').read_text().splitlines())
+        assert final_required_words == {'red', 'fork'}
 
 
 for testfn in ALL_TESTS: